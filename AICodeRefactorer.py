@@ -1,36 +1,80 @@
 import sys
 import re
-import ollama
+import json
+import asyncio
+import os
+import hashlib
+import sqlite3
+import threading
+import queue
+import socket
+from collections import OrderedDict
+from ollama import AsyncClient, Client
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QComboBox, QTextEdit, QPushButton, QLabel, QMessageBox, QFileDialog
 )
-from PyQt6.QtCore import QThread, pyqtSignal, QObject
-from PyQt6.QtGui import QFont
-
-# --- 1. Ollama 프롬프트 설정 (Flask 버전과 동일) ---
-
-# ⭐️ (참고) JS와 한국어 설명 프롬프트는 이전에 개선한 버전입니다.
-REFACTOR_PROMPTS = {
-    'python': """
-You are an expert Python developer specializing in code refactoring...
-- Return ONLY the refactored Python code inside a single markdown code block.
-""", 
-    'javascript': """
-You are an expert JavaScript developer specializing in code refactoring...
-- **CRITICAL:** You MUST improve all variable and function names...
-- Return ONLY the refactored JavaScript code inside a single markdown code block.
-""", 
-    'c': """
-You are an expert C developer specializing in code refactoring...
-- Return ONLY the refactored C code inside a single markdown code block.
-""" 
-}
+from PyQt6.QtCore import QThread, pyqtSignal, QObject, Qt
+from PyQt6.QtGui import QFont, QTextCursor
+
+# --- 1. Ollama 모델 및 프롬프트 설정 (Flask 버전과 동일) ---
+# ⭐️ 리팩토링(코드 생성)은 큰 모델, 한국어 설명만 따로 요청할 때는 더 작고 빠른 모델을 사용합니다.
+REFACTOR_MODEL = 'llama3:8b'
+EXPLAIN_MODEL = 'llama3.2:3b-instruct-q4_K_M'
+
+OLLAMA_SERVER = ('127.0.0.1', 11434) # Ollama 서버 주소 (시작 시 연결 확인용)
+
+# ⭐️ (참고) Ollama 서버는 아래 환경 변수를 설정한 뒤 실행하는 것을 권장합니다.
+#      OLLAMA_NUM_PARALLEL=2       # 모델 하나당 동시에 처리할 요청 수
+#      OLLAMA_MAX_LOADED_MODELS=2  # 메모리에 올려둘 모델 수 (리팩토링용 + 설명용 두 모델이 함께 상주)
+
+# ⭐️ 모델을 메모리에 유지할 시간. 모델이 내려가지 않아야 시스템 프롬프트의 KV 캐시도 재사용됩니다.
+KEEP_ALIVE = '30m'
+
+# ⭐️ 생성 옵션: 컨텍스트(KV 캐시) 크기를 작업량에 맞게 줄이고, 낮은 temperature로 출력 형식을 안정시킵니다.
+OPTIONS = {'num_ctx': 4096, 'num_predict': 1024, 'temperature': 0.2, 'top_p': 0.9}
+# 통합 호출은 코드와 설명을 함께 생성하므로 출력 길이만 늘립니다. (num_ctx가 같아야 모델을 다시 올리지 않습니다)
+ANALYZE_OPTIONS = {**OPTIONS, 'num_predict': 2048}
+
+# --- 1-0. 지원 언어 (사용자 메시지 첫 줄에 표시할 이름) ---
+LANGUAGE_NAMES = {'python': 'Python', 'javascript': 'JavaScript', 'c': 'C'}
+
+# ⭐️ 프롬프트는 언어와 무관한 고정 문자열입니다. (언어는 사용자 메시지 첫 줄로 전달)
+#    시스템 프롬프트가 모든 요청에서 똑같아야 Ollama가 프롬프트 앞부분의 KV 캐시를 재사용할 수 있습니다.
+
+# --- 1-1. 리팩토링 프롬프트 (언어별 규칙을 하나의 고정 문자열에 모두 포함) ---
+REFACTOR_RULES = """
+Apply ONLY the rules for the language of the given code:
+[Python]
+- Rewrite the code to be more efficient, readable, and Pythonic (PEP 8).
+- Improve variable names to be descriptive.
+- Use list comprehensions or generators where appropriate.
+[JavaScript]
+- Rewrite the code to be more efficient, readable, and modern (ES6+).
+- **CRITICAL:** You MUST improve all variable and function names to be descriptive (use camelCase). Do not use generic names like 'arr' or 'process'.
+- You MUST replace all 'var' keywords with 'const' or 'let'. This applies to all code, including outside of functions.
+- Use array methods like .map(), .filter(), .reduce() instead of old for loops.
+- Use arrow functions (=>) where appropriate.
+[C]
+- Rewrite the code to be more efficient, safe, and readable.
+- Improve variable names (use snake_case).
+- Add 'const' where appropriate to indicate read-only data.
+"""
+
+REFACTOR_PROMPT = """
+You are an expert software developer specializing in code refactoring.
+Your task is to rewrite the given code following the rules below.
+The programming language of the code is given in the first line of the user message.
+""" + REFACTOR_RULES + """
+- Return ONLY the refactored code inside a single markdown code block.
+- Do not add any explanatory text before or after the code block.
+"""
 
 # ⭐️ --- 1-3. [수정] 한국어 설명 프롬프트 (더 강력하게) ---
-KOREAN_EXPLAIN_PROMPT_TEMPLATE = """
+KOREAN_EXPLAIN_PROMPT = """
 You are a helpful technical writer who is fluent in Korean.
-Your task is to take the given {language} code and write a clear, concise explanation of it.
+Your task is to take the given code and write a clear, concise explanation of it.
+The programming language of the code is given in the first line of the user message.
 **YOUR RESPONSE MUST BE ENTIRELY IN KOREAN.**
 
 - Explain the main purpose of the code or function in KOREAN.
@@ -41,6 +85,174 @@ Your task is to take the given {language} code and write a clear, concise explan
 - **YOUR FINAL ANSWER MUST BE ONLY IN KOREAN.**
 """
 
+# ⭐️ --- 1-4. 리팩토링 + 한국어 설명 통합 프롬프트 (JSON 응답) ---
+# 두 작업을 한 번의 호출로 처리하여 프롬프트 평가(prefill) 비용을 한 번만 지불합니다.
+ANALYZE_PROMPT = """
+You are an expert software developer and a helpful technical writer who is fluent in Korean.
+Your task is to refactor the given code to be more efficient and readable, and then explain the refactored code.
+The programming language of the code is given in the first line of the user message.
+""" + REFACTOR_RULES + """
+
+You MUST respond with a single JSON object with exactly these two keys:
+- "refactored_code": ONLY the refactored code as a plain string. Do NOT wrap it in a markdown code block.
+- "korean_explanation": a clear, concise explanation of the refactored code. **IT MUST BE ENTIRELY IN KOREAN.**
+  - Explain the main purpose of the code or function in KOREAN.
+  - **파라미터 (Parameters):** Clearly state in KOREAN how many parameters the function takes. Then, list and describe ONLY the function's parameters (inputs) in KOREAN.
+  - **반환 값 (Return Value):** Clearly describe what the function returns (output) in KOREAN.
+  - **CRITICAL:** Do NOT confuse parameters (inputs) with the return value (output).
+  - **IMPORTANT:** Do NOT include the code itself in the explanation.
+
+Do not add any text outside the JSON object.
+"""
+
+# ⭐️ 코드 블록 제거용 정규식 (모듈 로드 시 한 번만 컴파일)
+_FENCE_OPEN = re.compile(r'^```[a-zA-Z]*\n')
+_FENCE_CLOSE = re.compile(r'\n```$')
+
+# --- 1-5. 응답 캐시 설정 ---
+# 같은 코드를 다시 제출하면 모델을 호출하지 않고 저장된 결과를 바로 돌려줍니다.
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'ai_refactor', 'cache.sqlite')
+CACHE_MAX_ENTRIES = 256 # 메모리(LRU)에 보관할 최대 항목 수
+
+CANCEL_POLL_INTERVAL = 0.1 # 진행 중인 분석의 취소 여부를 확인하는 간격 (초)
+
+class ResponseCache:
+    """
+    LLM 응답 캐시 (메모리 LRU + SQLite 영구 저장)
+    키에는 모델/프롬프트 지문(namespace)이 포함되므로, 프롬프트가 바뀌면 이전 결과는 자동으로 무시됩니다.
+    """
+
+    def __init__(self, path: str, namespace: str, maxsize: int = CACHE_MAX_ENTRIES):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.db.commit()
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️ 캐시 파일을 열 수 없어 메모리 캐시만 사용합니다: {e}")
+            self.db = None
+
+    def make_key(self, step: str, language: str, code_hash: str) -> str:
+        """(단계, 언어, 코드 해시)로 캐시 키를 만듭니다. code_hash는 hash_code()로 구합니다."""
+        return f"{self.namespace}:{step}:{language}:{code_hash}"
+
+    def _remember(self, key: str, value: str):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str):
+        """캐시된 값을 반환합니다. 없으면 None을 반환합니다."""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+            if self.db is None:
+                return None
+            try:
+                row = self.db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                return None
+            if row is None:
+                return None
+            self._remember(key, row[0])
+            return row[0]
+
+    def set(self, key: str, value: str):
+        """값을 메모리와 SQLite에 저장합니다. 파일 저장에 실패해도 메모리에는 남습니다."""
+        with self.lock:
+            self._remember(key, value)
+            if self.db is None:
+                return
+            try:
+                self.db.execute("INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)", (key, value))
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ 캐시 저장 실패 (무시합니다): {e}")
+
+
+def hash_code(code_snippet: str) -> str:
+    """
+    원본 코드의 해시를 구합니다.
+    요청마다 한 번만 계산하여 모든 단계(리팩토링/문서화/설명)의 캐시 키로 함께 사용합니다.
+    (문서화/설명 단계도 입력인 리팩토링 결과 대신 원본 코드의 해시로 저장됩니다)
+    """
+    return hashlib.blake2b(code_snippet.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def prompt_fingerprint(*parts: str) -> str:
+    """모델 이름과 프롬프트 문자열로 짧은 지문을 만듭니다."""
+    return hashlib.blake2b('\0'.join(parts).encode('utf-8'), digest_size=8).hexdigest()
+
+
+class JsonFieldStreamer:
+    """
+    스트리밍 중인 JSON 응답에서 지정한 문자열 필드의 값만 디코딩하여 돌려줍니다.
+    (통합 호출 중에도 리팩토링된 코드를 실시간으로 화면에 보여주기 위해 사용)
+    """
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self, field: str):
+        self.key_pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self.buffer = ''
+        self.pos = 0 # 다음에 디코딩할 위치
+        self.state = 'search' # 'search' -> 'value' -> 'done'
+
+    def feed(self, text: str) -> str:
+        """새로 받은 조각을 넣고, 이번에 새로 디코딩된 필드 값을 반환합니다."""
+        self.buffer += text
+        if self.state == 'search':
+            match = self.key_pattern.search(self.buffer)
+            if not match:
+                return ''
+            self.state = 'value'
+            self.pos = match.end()
+        if self.state != 'value':
+            return ''
+
+        buf, i, out = self.buffer, self.pos, []
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.state = 'done'
+                i += 1
+                break
+            if ch != '\\':
+                out.append(ch)
+                i += 1
+                continue
+            # 이스케이프 시퀀스가 조각 경계에서 잘렸으면 다음 조각을 기다립니다.
+            if i + 1 >= len(buf):
+                break
+            if buf[i + 1] != 'u':
+                out.append(self._ESCAPES.get(buf[i + 1], buf[i + 1]))
+                i += 2
+                continue
+            if i + 6 > len(buf):
+                break
+            try:
+                code_point = int(buf[i + 2:i + 6], 16)
+                if 0xD800 <= code_point < 0xDC00: # 서로게이트 쌍 (\uD83D\uDE00 등)
+                    if i + 12 > len(buf):
+                        break
+                    low = int(buf[i + 8:i + 12], 16)
+                    code_point = 0x10000 + ((code_point - 0xD800) << 10) + (low - 0xDC00)
+                    i += 6
+                out.append(chr(code_point))
+            except ValueError:
+                # 잘못된 이스케이프는 표시만 멈추고, 최종 결과는 json.loads가 판단합니다.
+                self.state = 'done'
+                break
+            i += 6
+        self.pos = i
+        return ''.join(out)
+
+
 # --- 2. Ollama 작업을 위한 'Worker' 스레드 ---
 
 class OllamaWorker(QObject):
@@ -50,86 +262,281 @@ class OllamaWorker(QObject):
     """
     # ⭐️ 작업 완료 시그널: 결과(dict)를 메인 스레드로 전달
     finished = pyqtSignal(dict)
+    # ⭐️ 스트리밍 시그널: 생성 중인 리팩토링 코드 조각을 실시간으로 전달 (int: 요청 번호, str: 조각)
+    partial_token = pyqtSignal(int, str)
+    # ⭐️ 지금까지 보낸 조각을 지우고 다시 받아야 할 때 (대체 경로로 재요청하는 경우, int: 요청 번호)
+    partial_reset = pyqtSignal(int)
 
     def __init__(self):
         super().__init__()
-        self.korean_explain_prompt = KOREAN_EXPLAIN_PROMPT_TEMPLATE
-        self.refactor_prompts = REFACTOR_PROMPTS
+        self.korean_explain_prompt = KOREAN_EXPLAIN_PROMPT
+        self.refactor_prompt = REFACTOR_PROMPT
+        self.analyze_prompt = ANALYZE_PROMPT
+        self.cache = ResponseCache(CACHE_PATH, namespace='gui-' + prompt_fingerprint(
+            REFACTOR_MODEL, EXPLAIN_MODEL, json.dumps(ANALYZE_OPTIONS, sort_keys=True),
+            ANALYZE_PROMPT, KOREAN_EXPLAIN_PROMPT, REFACTOR_PROMPT
+        ))
+        # ⭐️ 요청 큐: 메인 스레드가 (요청 번호, 코드, 언어)를 넣고, Worker 스레드가 꺼내 처리합니다.
+        self.requests = queue.Queue()
+        self.latest_request_id = 0 # 가장 최근에 제출된 요청 번호 (이보다 오래된 요청은 취소 대상)
+        self.active_request_id = 0 # 지금 처리 중인 요청 번호
+        self.cancel_event = threading.Event() # 설정되면 모든 작업을 중단 (앱 종료 시)
+
+    def submit(self, request_id: int, code: str, language: str):
+        """
+        (메인 스레드에서 호출) 분석 요청을 큐에 넣습니다.
+        새 요청이 들어오면 이전 요청은 자동으로 취소됩니다.
+        """
+        self.latest_request_id = request_id
+        self.requests.put((request_id, code, language))
+
+    def cancel(self):
+        """(메인 스레드에서 직접 호출) 진행 중인 분석과 대기 중인 요청을 모두 중단합니다."""
+        self.cancel_event.set()
+
+    def is_stale(self, request_id) -> bool:
+        """더 새로운 요청이 들어왔거나 전체 취소가 요청되었으면 True를 반환합니다."""
+        if self.cancel_event.is_set():
+            return True
+        return request_id is not None and request_id != self.latest_request_id
+
+    async def run_cancellable(self, coro, request_id=None):
+        """
+        작업을 실행하면서 주기적으로 취소 여부를 확인합니다.
+        취소되면 작업을 cancel() 하여 진행 중인 스트리밍 응답을 닫고,
+        Ollama 서버의 생성도 중단되도록 합니다. (asyncio.CancelledError 발생)
+        """
+        task = asyncio.ensure_future(coro)
+        while not task.done():
+            await asyncio.wait({task}, timeout=CANCEL_POLL_INTERVAL)
+            if not task.done() and self.is_stale(request_id):
+                task.cancel()
+        return task.result()
 
     def clean_llm_response(self, response_text: str) -> str:
         """LLM 응답에서 Markdown 코드 블록을 제거합니다."""
-        cleaned_text = re.sub(r'^```[a-zA-Z]*\n', '', response_text.strip())
-        cleaned_text = re.sub(r'\n```$', '', cleaned_text)
-        return cleaned_text.strip()
+        return _FENCE_CLOSE.sub('', _FENCE_OPEN.sub('', response_text.strip())).strip()
+
+    def build_user_message(self, code_snippet: str, language: str) -> str:
+        """언어 정보를 사용자 메시지 첫 줄에 붙입니다."""
+        return f"Language: {LANGUAGE_NAMES.get(language, language)}\n\n{code_snippet}"
+
+    async def warm_up(self):
+        """
+        통합 프롬프트로 토큰 1개만 생성하여 모델을 미리 올리고,
+        시스템 프롬프트의 KV 캐시를 채워 둡니다.
+        """
+        client = AsyncClient()
+        await client.chat(
+            model=REFACTOR_MODEL,
+            messages=[{'role': 'system', 'content': self.analyze_prompt}],
+            options={**OPTIONS, 'num_predict': 1},
+            keep_alive=KEEP_ALIVE
+        )
 
-    def refactor_code(self, code_snippet: str, language: str) -> (str, str):
+    def run_warm_up(self):
+        """Worker 스레드가 시작될 때 호출됩니다. 실패해도 분석에는 영향이 없습니다."""
+        try:
+            asyncio.run(self.run_cancellable(self.warm_up()))
+            print("🔥 모델 예열 완료.")
+        except asyncio.CancelledError:
+            print("⏹️ 모델 예열이 취소되었습니다.")
+        except Exception as e:
+            print(f"⚠️ 모델 예열 실패 (무시합니다): {e}")
+
+    def emit_partial(self, text: str):
+        """빈 문자열이 아닐 때만 스트리밍 조각을 보냅니다."""
+        if text:
+            self.partial_token.emit(self.active_request_id, text)
+
+    async def stream_chat(self, client: AsyncClient, on_token=None, **chat_kwargs) -> str:
+        """
+        ollama.chat(stream=True)로 응답을 조각 단위로 받아 합친 문자열을 반환합니다.
+        on_token이 주어지면 조각을 받을 때마다 호출합니다.
+        """
+        chunks = []
+        async for chunk in await client.chat(stream=True, **chat_kwargs):
+            token = chunk['message']['content']
+            chunks.append(token)
+            if on_token:
+                on_token(token)
+        return ''.join(chunks)
+
+    async def refactor_code(self, client: AsyncClient, code_snippet: str, language: str, code_hash: str) -> (str, str):
         """코드를 리팩토링합니다."""
-        system_prompt = self.refactor_prompts.get(language)
-        if not system_prompt:
+        system_prompt = self.refactor_prompt
+        if language not in LANGUAGE_NAMES:
             return None, f"'{language}' 언어는 지원되지 않습니다."
+        cache_key = self.cache.make_key('refactor', language, code_hash)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached, None
         try:
-            response = ollama.chat(
-                model='llama3:8b',
+            content = await self.stream_chat(
+                client,
+                self.emit_partial,
+                model=REFACTOR_MODEL,
                 messages=[
                     {'role': 'system', 'content': system_prompt},
-                    {'role': 'user', 'content': code_snippet}
-                ]
+                    {'role': 'user', 'content': self.build_user_message(code_snippet, language)}
+                ],
+                options=OPTIONS,
+                keep_alive=KEEP_ALIVE
             )
-            return self.clean_llm_response(response['message']['content']), None
+            ref_code = self.clean_llm_response(content)
+            self.cache.set(cache_key, ref_code)
+            return ref_code, None
         except Exception as e:
             return None, f"Ollama API 호출 중 오류 (리팩토링): {e}"
 
-    def explain_code_in_korean(self, code_snippet: str, language: str) -> (str, str):
+    async def explain_code_in_korean(self, client: AsyncClient, code_snippet: str, language: str, code_hash: str) -> (str, str):
         """코드를 한국어로 설명합니다."""
-        system_prompt = self.korean_explain_prompt.format(language=language.capitalize())
+        # ⭐️ 시스템 프롬프트는 항상 동일한 문자열로 보내고, 언어 정보는 사용자 메시지에 담습니다.
+        system_prompt = self.korean_explain_prompt
+        cache_key = self.cache.make_key('explain', language, code_hash)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached, None
         try:
-            response = ollama.chat(
-                model='llama3:8b',
+            content = await self.stream_chat(
+                client,
+                model=EXPLAIN_MODEL,
                 messages=[
                     {'role': 'system', 'content': system_prompt},
-                    {'role': 'user', 'content': code_snippet}
-                ]
+                    {'role': 'user', 'content': self.build_user_message(code_snippet, language)}
+                ],
+                options=OPTIONS,
+                keep_alive=KEEP_ALIVE
             )
-            return response['message']['content'].strip(), None
+            kor_text = content.strip()
+            self.cache.set(cache_key, kor_text)
+            return kor_text, None
         except Exception as e:
             return None, f"Ollama API 호출 중 오류 (한국어 설명): {e}"
 
-    def run_analysis(self, code: str, language: str):
+    async def refactor_and_explain(self, client: AsyncClient, code_snippet: str, language: str, code_hash: str) -> (dict, str):
         """
-        메인 분석 로직 (리팩토링 -> 한국어 설명)
+        리팩토링과 한국어 설명을 한 번의 호출(JSON 모드)로 요청합니다.
+        응답을 JSON으로 해석할 수 없으면 (None, None)을 반환합니다.
         """
-        result = {'refactored_code': '', 'korean_explanation': '', 'error': None}
+        if language not in LANGUAGE_NAMES:
+            return None, f"'{language}' 언어는 지원되지 않습니다."
+        # ⭐️ 시스템 프롬프트는 항상 동일한 문자열로 보내고, 언어 정보는 사용자 메시지에 담습니다.
+        system_prompt = self.analyze_prompt
+        cache_key = self.cache.make_key('analyze', language, code_hash)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return json.loads(cached), None
+        # ⭐️ JSON 응답 중 "refactored_code" 값만 골라 화면에 실시간으로 보냅니다.
+        code_streamer = JsonFieldStreamer('refactored_code')
         try:
-            # 1단계: 리팩토링
-            ref_code, err_ref = self.refactor_code(code, language)
-            if err_ref:
-                raise Exception(err_ref)
-            result['refactored_code'] = ref_code
-
-            # 2단계: 한국어 설명 (리팩토링된 코드를 기반으로 생성)
-            kor_text, err_kor = self.explain_code_in_korean(ref_code, language)
-            if err_kor:
-                raise Exception(err_kor)
-            result['korean_explanation'] = kor_text
-
-            # ⭐️ 성공 시 결과물을 메인 스레드로 전송
-            self.finished.emit(result)
-
+            content = await self.stream_chat(
+                client,
+                lambda token: self.emit_partial(code_streamer.feed(token)),
+                model=REFACTOR_MODEL,
+                format='json',
+                messages=[
+                    {'role': 'system', 'content': system_prompt},
+                    {'role': 'user', 'content': self.build_user_message(code_snippet, language)}
+                ],
+                options=ANALYZE_OPTIONS,
+                keep_alive=KEEP_ALIVE
+            )
         except Exception as e:
-            result['error'] = str(e)
-            # ⭐️ 실패 시에도 에러 메시지를 메인 스레드로 전송
+            return None, f"Ollama API 호출 중 오류 (리팩토링 + 한국어 설명): {e}"
+
+        try:
+            data = json.loads(content)
+            ref_code = data['refactored_code']
+            kor_text = data['korean_explanation']
+        except (ValueError, KeyError, TypeError):
+            return None, None
+        if not isinstance(ref_code, str) or not isinstance(kor_text, str) or not ref_code.strip():
+            return None, None
+        # ⭐️ JSON 문자열 안에 코드 블록이 섞여 오는 경우를 대비해 한 번 더 정리합니다.
+        combined = {
+            'refactored_code': self.clean_llm_response(ref_code),
+            'korean_explanation': kor_text.strip()
+        }
+        self.cache.set(cache_key, json.dumps(combined, ensure_ascii=False))
+        return combined, None
+
+    async def analyze(self, code: str, language: str) -> dict:
+        """
+        메인 분석 로직 (리팩토링 + 한국어 설명)
+        한 번의 JSON 호출을 먼저 시도하고, 실패하면 기존 2단계 방식으로 처리합니다.
+        """
+        result = {'refactored_code': '', 'korean_explanation': '', 'error': None}
+        # ⭐️ AsyncClient는 이벤트 루프에 묶이므로 분석마다 새로 만듭니다.
+        client = AsyncClient()
+        # ⭐️ 원본 코드의 해시는 한 번만 계산하여 모든 단계의 캐시 키로 사용합니다.
+        code_hash = hash_code(code)
+
+        combined, err_combined = await self.refactor_and_explain(client, code, language, code_hash)
+        if err_combined:
+            raise Exception(err_combined)
+        if combined:
+            result.update(combined)
+            return result
+
+        # (대체 경로) 한국어 설명은 리팩토링 결과를 입력으로 사용하므로 두 단계는 순서대로 실행됩니다.
+        print("⚠️ JSON 응답을 해석할 수 없어 2단계 방식으로 다시 요청합니다.")
+        self.partial_reset.emit(self.active_request_id)
+
+        # 1단계: 리팩토링
+        ref_code, err_ref = await self.refactor_code(client, code, language, code_hash)
+        if err_ref:
+            raise Exception(err_ref)
+        result['refactored_code'] = ref_code
+
+        # 2단계: 한국어 설명 (리팩토링된 코드를 기반으로 생성)
+        kor_text, err_kor = await self.explain_code_in_korean(client, ref_code, language, code_hash)
+        if err_kor:
+            raise Exception(err_kor)
+        result['korean_explanation'] = kor_text
+        return result
+
+    def run_analysis(self):
+        """
+        Worker 스레드에서 실행되는 진입점입니다. (요청 큐 소비자)
+        큐에 쌓인 요청을 꺼내 처리하며, 이미 더 새로운 요청이 들어온 경우는 건너뜁니다.
+        스레드 안에서 별도의 이벤트 루프를 돌려 비동기 분석을 실행합니다.
+        """
+        while True:
+            try:
+                request_id, code, language = self.requests.get_nowait()
+            except queue.Empty:
+                return
+            if self.is_stale(request_id):
+                continue
+
+            self.active_request_id = request_id
+            result = {'request_id': request_id, 'refactored_code': '', 'korean_explanation': '',
+                      'error': None, 'cancelled': False}
+            try:
+                result.update(asyncio.run(self.run_cancellable(self.analyze(code, language), request_id)))
+            except asyncio.CancelledError:
+                result['cancelled'] = True
+            except Exception as e:
+                # ⭐️ 실패 시에도 에러 메시지를 메인 스레드로 전송
+                result['error'] = str(e)
+            # ⭐️ 결과물을 메인 스레드로 전송
             self.finished.emit(result)
 
 
 # --- 3. 메인 윈도우 (GUI) ---
 
 class CodeRefactorApp(QMainWindow):
-    # ⭐️ Worker 스레드를 시작시킬 시그널 (str: code, str: language)
-    start_analysis_signal = pyqtSignal(str, str)
+    # ⭐️ Worker 스레드에게 요청 큐를 처리하라고 알리는 시그널 (요청 내용은 큐로 전달)
+    start_analysis_signal = pyqtSignal()
+    # ⭐️ 진행 중인 분석을 중단시키는 시그널 (Worker 스레드가 바빠도 바로 실행되도록 직접 연결)
+    cancel_signal = pyqtSignal()
 
     def __init__(self):
         super().__init__()
         self.korean_explanation = "" # 다운로드할 한국어 설명을 저장
+        self.request_counter = 0 # 요청마다 증가하는 번호 (오래된 결과를 걸러내는 데 사용)
+        self.is_busy = False
         self.initUI()
         self.initThreads()
 
@@ -167,6 +574,7 @@ class CodeRefactorApp(QMainWindow):
         self.output_text = QTextEdit()
         self.output_text.setFont(QFont("Courier", 10))
         self.output_text.setReadOnly(True) # 읽기 전용
+        self.output_text.setUndoRedoEnabled(False) # 읽기 전용이므로 실행 취소 기록이 필요 없음 (스트리밍 중 메모리 절약)
         main_layout.addWidget(self.output_text)
 
         # 5. 다운로드 버튼
@@ -184,6 +592,10 @@ class CodeRefactorApp(QMainWindow):
         # 시그널 연결
         self.start_analysis_signal.connect(self.worker.run_analysis) # 1
         self.worker.finished.connect(self.on_analysis_finished) # 2
+        self.worker.partial_token.connect(self.append_partial_token) # 생성 중인 코드 실시간 표시
+        self.worker.partial_reset.connect(self.reset_partial_output)
+        self.cancel_signal.connect(self.worker.cancel, Qt.ConnectionType.DirectConnection)
+        self.worker_thread.started.connect(self.worker.run_warm_up) # 스레드 시작 시 모델 예열
 
         self.worker_thread.start()
 
@@ -196,29 +608,68 @@ class CodeRefactorApp(QMainWindow):
             QMessageBox.warning(self, "입력 오류", "코드를 입력하세요.")
             return
 
-        # ⭐️ UI를 멈추지 않기 위해 시그널을 '방출'합니다.
-        #    그러면 백그라운드 스레드에서 self.worker.run_analysis가 실행됩니다.
+        # ⭐️ 분석 중에 다시 누르면, 이전 분석을 취소하고 새로 시작할지 묻습니다.
+        if self.is_busy:
+            answer = QMessageBox.question(
+                self, "분석 진행 중",
+                "이전 분석이 아직 진행 중입니다.\n이전 분석을 취소하고 새로 분석할까요?"
+            )
+            if answer != QMessageBox.StandardButton.Yes:
+                return
+            print("⏹️ 이전 분석을 취소합니다.")
+
+        # ⭐️ 요청을 큐에 넣고 시그널을 '방출'합니다.
+        #    그러면 백그라운드 스레드에서 self.worker.run_analysis가 큐를 처리합니다.
+        #    (새 요청이 큐에 들어가면 진행 중인 이전 요청은 Worker가 스스로 중단합니다.)
         print("🤖 AI 분석 시작...")
-        self.run_button.setEnabled(False)
-        self.run_button.setText("분석 중... 🤖")
+        self.request_counter += 1
+        self.is_busy = True
+        self.run_button.setText("분석 중... 🤖 (다시 누르면 새로 분석)")
         self.download_button.setEnabled(False)
-        self.output_text.setPlainText("")
-        
-        self.start_analysis_signal.emit(code, language)
+        self.set_output_text("")
+
+        self.worker.submit(self.request_counter, code, language)
+        self.start_analysis_signal.emit()
+
+    def set_output_text(self, text: str):
+        """
+        출력 창의 내용을 통째로 교체합니다.
+        위젯 대신 문서(QTextDocument)에 직접 쓰고 시그널을 막아, 큰 결과에서도 불필요한 갱신을 줄입니다.
+        """
+        self.output_text.blockSignals(True)
+        self.output_text.document().setPlainText(text)
+        self.output_text.blockSignals(False)
+
+    def reset_partial_output(self, request_id: int):
+        """현재 요청의 스트리밍 출력을 지웁니다."""
+        if request_id == self.request_counter:
+            self.set_output_text("")
+
+    def append_partial_token(self, request_id: int, token: str):
+        """Worker가 보낸 코드 조각을 출력 창 끝에 이어 붙입니다. (취소된 이전 요청의 조각은 무시)"""
+        if request_id != self.request_counter:
+            return
+        self.output_text.moveCursor(QTextCursor.MoveOperation.End)
+        self.output_text.insertPlainText(token)
 
     def on_analysis_finished(self, result: dict):
         """Worker 스레드에서 작업이 완료되면 호출됩니다."""
+        # ⭐️ 취소되었거나 이미 새 요청으로 대체된 결과는 무시합니다.
+        if result['cancelled'] or result['request_id'] != self.request_counter:
+            print("⏹️ 이전 분석이 취소되었습니다.")
+            return
+
         print("✅ AI 분석 완료.")
-        self.run_button.setEnabled(True)
+        self.is_busy = False
         self.run_button.setText("✨ AI로 분석하기")
 
         if result['error']:
             # 에러 발생 시
             QMessageBox.critical(self, "API 오류", f"오류 발생:\n{result['error']}")
-            self.output_text.setPlainText("")
+            self.set_output_text("")
         else:
             # 성공 시
-            self.output_text.setPlainText(result['refactored_code'])
+            self.set_output_text(result['refactored_code'])
             self.korean_explanation = result['korean_explanation']
             self.download_button.setEnabled(True) # 다운로드 버튼 활성화
 
@@ -250,21 +701,49 @@ class CodeRefactorApp(QMainWindow):
         (중요) 앱이 닫힐 때 백그라운드 스레드도 같이 종료합니다.
         """
         print("애플리케이션 종료...")
+        self.cancel_signal.emit() # 진행 중인 분석이 있으면 중단해야 스레드가 바로 끝납니다.
         self.worker_thread.quit()
         self.worker_thread.wait()
         event.accept()
 
 # --- 4. 애플리케이션 실행 ---
 
+def is_ollama_running(timeout: float = 0.5) -> bool:
+    """
+    TCP 연결만 시도하여 Ollama 서버가 실행 중인지 빠르게 확인합니다.
+    (ollama.list()와 달리 모델 목록 전체를 받아오지 않습니다)
+    """
+    try:
+        with socket.create_connection(OLLAMA_SERVER, timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+def find_missing_models() -> list:
+    """설치된 모델 목록을 조회하여, 필요한 모델 중 설치되지 않은 것을 반환합니다. (--verify 옵션)"""
+    installed = {model.get('model') or model.get('name') for model in Client().list()['models']}
+    return [name for name in (REFACTOR_MODEL, EXPLAIN_MODEL) if name not in installed]
+
 if __name__ == '__main__':
     # (Ollama 서버가 실행 중인지 확인하세요!)
-    try:
-        ollama.list()
-    except Exception as e:
+    if not is_ollama_running():
         print("❌ Ollama 서버가 실행 중이지 않습니다.")
         print("Ollama를 먼저 실행한 후 이 프로그램을 다시 시작하세요.")
         sys.exit(1)
-        
+
+    # ⭐️ --verify 옵션을 주면 필요한 모델이 모두 설치되어 있는지도 확인합니다.
+    if '--verify' in sys.argv:
+        try:
+            missing_models = find_missing_models()
+        except Exception as e:
+            print(f"❌ Ollama 모델 목록을 가져오지 못했습니다: {e}")
+            sys.exit(1)
+        if missing_models:
+            print(f"❌ 필요한 모델이 설치되어 있지 않습니다: {', '.join(missing_models)}")
+            print("Download_LLM_Model을 먼저 실행하여 모델을 설치하세요.")
+            sys.exit(1)
+        print("✅ 필요한 모델이 모두 설치되어 있습니다.")
+
     app = QApplication(sys.argv)
     window = CodeRefactorApp()
     window.show()
@@ -1,79 +1,89 @@
-import ollama
-from flask import Flask, request, render_template_string
+import asyncio
+import json
+import os
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from ollama import AsyncClient
+from flask import Flask, request
+from jinja2 import Environment, BaseLoader
 import re
 
 # --- Flask 앱 초기화 ---
 app = Flask(__name__)
 
 # --- 1. Ollama 모델 및 프롬프트 설정 (⭐️ 이 섹션이 수정되었습니다) ---
-MODEL_NAME = 'llama3:8b'
+# ⭐️ 리팩토링(코드 생성)은 큰 모델, 한국어 설명만 따로 요청할 때는 더 작고 빠른 모델을 사용합니다.
+REFACTOR_MODEL = 'llama3:8b'
+EXPLAIN_MODEL = 'llama3.2:3b-instruct-q4_K_M'
 
-# --- 1-1. 리팩토링 프롬프트 (Python, C는 동일) ---
-REFACTOR_PROMPTS = {
-    'python': """
-You are an expert Python developer specializing in code refactoring.
-Your task is to rewrite the given Python code to be more efficient, readable, and Pythonic (PEP 8).
+# ⭐️ (참고) 문서화와 한국어 설명 요청은 동시에 전송됩니다.
+#    Ollama 서버가 두 요청을 실제로 병렬 처리하도록 서버 실행 전에 아래 환경 변수를 설정하세요.
+#      OLLAMA_NUM_PARALLEL=2       # 모델 하나당 동시에 처리할 요청 수
+#      OLLAMA_MAX_LOADED_MODELS=2  # 메모리에 올려둘 모델 수 (리팩토링용 + 설명용 두 모델이 함께 상주)
+
+# ⭐️ 모델을 메모리에 유지할 시간. 모델이 내려가지 않아야 시스템 프롬프트의 KV 캐시도 재사용됩니다.
+KEEP_ALIVE = '30m'
+
+# ⭐️ 생성 옵션: 컨텍스트(KV 캐시) 크기를 작업량에 맞게 줄이고, 낮은 temperature로 출력 형식을 안정시킵니다.
+OPTIONS = {'num_ctx': 4096, 'num_predict': 1024, 'temperature': 0.2, 'top_p': 0.9}
+# 통합 호출은 코드와 설명을 함께 생성하므로 출력 길이만 늘립니다. (num_ctx가 같아야 모델을 다시 올리지 않습니다)
+ANALYZE_OPTIONS = {**OPTIONS, 'num_predict': 2048}
+
+# --- 1-0. 지원 언어 (사용자 메시지 첫 줄에 표시할 이름) ---
+LANGUAGE_NAMES = {'python': 'Python', 'javascript': 'JavaScript', 'c': 'C'}
+
+# ⭐️ 프롬프트는 언어와 무관한 고정 문자열입니다. (언어는 사용자 메시지 첫 줄로 전달)
+#    시스템 프롬프트가 모든 요청에서 똑같아야 Ollama가 프롬프트 앞부분의 KV 캐시를 재사용할 수 있습니다.
+
+# --- 1-1. 리팩토링 프롬프트 (언어별 규칙을 하나의 고정 문자열에 모두 포함) ---
+REFACTOR_RULES = """
+Apply ONLY the rules for the language of the given code:
+[Python]
+- Rewrite the code to be more efficient, readable, and Pythonic (PEP 8).
 - Improve variable names to be descriptive.
 - Use list comprehensions or generators where appropriate.
-- Return ONLY the refactored Python code inside a single markdown code block.
-- Do not add any explanatory text before or after the code block.
-""",
-    
-    # ⭐️ [수정] JS 프롬프트: 변수명 변경과 'var' 교체를 더욱 강력하게 지시
-    'javascript': """
-You are an expert JavaScript developer specializing in code refactoring.
-Your task is to rewrite the given JavaScript code to be more efficient, readable, and modern (ES6+).
+[JavaScript]
+- Rewrite the code to be more efficient, readable, and modern (ES6+).
 - **CRITICAL:** You MUST improve all variable and function names to be descriptive (use camelCase). Do not use generic names like 'arr' or 'process'.
 - You MUST replace all 'var' keywords with 'const' or 'let'. This applies to all code, including outside of functions.
 - Use array methods like .map(), .filter(), .reduce() instead of old for loops.
 - Use arrow functions (=>) where appropriate.
-- Return ONLY the refactored JavaScript code inside a single markdown code block.
-- Do not add any explanatory text before or after the code block.
-""",
-    
-    'c': """
-You are an expert C developer specializing in code refactoring.
-Your task is to rewrite the given C code to be more efficient, safe, and readable.
+[C]
+- Rewrite the code to be more efficient, safe, and readable.
 - Improve variable names (use snake_case).
 - Add 'const' where appropriate to indicate read-only data.
-- Return ONLY the refactored C code inside a single markdown code block.
+"""
+
+REFACTOR_PROMPT = """
+You are an expert software developer specializing in code refactoring.
+Your task is to rewrite the given code following the rules below.
+The programming language of the code is given in the first line of the user message.
+""" + REFACTOR_RULES + """
+- Return ONLY the refactored code inside a single markdown code block.
 - Do not add any explanatory text before or after the code block.
 """
-}
-
-# --- 1-2. 코드 문서화(주석) 프롬프트 (변경 없음) ---
-DOCUMENT_PROMPTS = {
-    'python': """
-You are an expert Python technical writer.
-Your task is to take the given Python code and add comprehensive documentation.
-- Add a detailed, Google-style docstring to the function (Args, Returns).
-- Add concise inline comments for any non-obvious logic.
-- Return ONLY the documented Python code inside a single markdown code block.
-- Do not add any explanatory text.
-""",
-    'javascript': """
-You are an expert JavaScript technical writer.
-Your task is to take the given JavaScript code and add comprehensive documentation.
-- Add a detailed, JSDoc-style comment block (@param, @returns).
-- Add concise inline comments for any non-obvious logic.
-- Return ONLY the documented JavaScript code inside a single markdown code block.
-- Do not add any explanatory text.
-""",
-    'c': """
-You are an expert C technical writer.
-Your task is to take the given C code and add comprehensive documentation.
-- Add a detailed, Doxygen-style comment block (@brief, @param, @return).
+
+# --- 1-2. 코드 문서화(주석) 프롬프트 ---
+DOCUMENT_PROMPT = """
+You are an expert technical writer.
+Your task is to take the given code and add comprehensive documentation.
+The programming language of the code is given in the first line of the user message.
+- Python: Add a detailed, Google-style docstring to the function (Args, Returns).
+- JavaScript: Add a detailed, JSDoc-style comment block (@param, @returns).
+- C: Add a detailed, Doxygen-style comment block (@brief, @param, @return).
 - Add concise inline comments for any non-obvious logic.
-- Return ONLY the documented C code inside a single markdown code block.
+- Return ONLY the documented code inside a single markdown code block.
 - Do not add any explanatory text.
 """
-}
 
-# ⭐️ --- 1-3. [수정] 한국어 설명 프롬프트 (템플릿) ---
+# ⭐️ --- 1-3. [수정] 한국어 설명 프롬프트 (언어와 무관한 고정 문자열) ---
 # '파라미터'와 '반환 값'을 혼동하지 않도록 명확하게 분리하고 경고 추가
-KOREAN_EXPLAIN_PROMPT_TEMPLATE = """
+KOREAN_EXPLAIN_PROMPT = """
 You are a helpful technical writer who is fluent in Korean.
-Your task is to take the given {language} code and write a clear, concise explanation of it in **Korean**.
+Your task is to take the given code and write a clear, concise explanation of it in **Korean**.
+The programming language of the code is given in the first line of the user message.
 - Explain the main purpose of the code or function.
 - **Parameters:** Clearly state how many parameters the function takes. Then, list and describe ONLY the function's parameters (inputs).
 - **Return Value:** Clearly describe what the function returns (output).
@@ -82,6 +92,106 @@ Your task is to take the given {language} code and write a clear, concise explan
 - Start the explanation directly.
 """
 
+# ⭐️ --- 1-4. 리팩토링 + 한국어 설명 통합 프롬프트 (JSON 응답) ---
+# 두 작업을 한 번의 호출로 처리하여 프롬프트 평가(prefill) 비용을 한 번만 지불합니다.
+ANALYZE_PROMPT = """
+You are an expert software developer and a helpful technical writer who is fluent in Korean.
+Your task is to refactor the given code to be more efficient and readable, and then explain the refactored code.
+The programming language of the code is given in the first line of the user message.
+""" + REFACTOR_RULES + """
+You MUST respond with a single JSON object with exactly these two keys:
+- "refactored_code": ONLY the refactored code as a plain string. Do NOT wrap it in a markdown code block.
+- "korean_explanation": a clear, concise explanation of the refactored code in **Korean**.
+  - Explain the main purpose of the code or function.
+  - **Parameters:** Clearly state how many parameters the function takes. Then, list and describe ONLY the function's parameters (inputs).
+  - **Return Value:** Clearly describe what the function returns (output).
+  - **IMPORTANT:** Do NOT confuse parameters (inputs) with the return value (output). They are separate.
+  - **IMPORTANT:** Do NOT include the code itself in the explanation.
+- Do not add any text outside the JSON object.
+"""
+
+# ⭐️ 코드 블록 제거용 정규식 (모듈 로드 시 한 번만 컴파일)
+_FENCE_OPEN = re.compile(r'^```[a-zA-Z]*\n')
+_FENCE_CLOSE = re.compile(r'\n```$')
+
+# --- 1-5. 응답 캐시 설정 ---
+# 같은 코드를 다시 제출하면 모델을 호출하지 않고 저장된 결과를 바로 돌려줍니다.
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'ai_refactor', 'cache.sqlite')
+CACHE_MAX_ENTRIES = 256 # 메모리(LRU)에 보관할 최대 항목 수
+
+class ResponseCache:
+    """
+    LLM 응답 캐시 (메모리 LRU + SQLite 영구 저장)
+    키에는 모델/프롬프트 지문(namespace)이 포함되므로, 프롬프트가 바뀌면 이전 결과는 자동으로 무시됩니다.
+    """
+
+    def __init__(self, path: str, namespace: str, maxsize: int = CACHE_MAX_ENTRIES):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.db.commit()
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️ 캐시 파일을 열 수 없어 메모리 캐시만 사용합니다: {e}")
+            self.db = None
+
+    def make_key(self, step: str, language: str, code_hash: str) -> str:
+        """(단계, 언어, 코드 해시)로 캐시 키를 만듭니다. code_hash는 hash_code()로 구합니다."""
+        return f"{self.namespace}:{step}:{language}:{code_hash}"
+
+    def _remember(self, key: str, value: str):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str):
+        """캐시된 값을 반환합니다. 없으면 None을 반환합니다."""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+            if self.db is None:
+                return None
+            try:
+                row = self.db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                return None
+            if row is None:
+                return None
+            self._remember(key, row[0])
+            return row[0]
+
+    def set(self, key: str, value: str):
+        """값을 메모리와 SQLite에 저장합니다. 파일 저장에 실패해도 메모리에는 남습니다."""
+        with self.lock:
+            self._remember(key, value)
+            if self.db is None:
+                return
+            try:
+                self.db.execute("INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)", (key, value))
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ 캐시 저장 실패 (무시합니다): {e}")
+
+
+def hash_code(code_snippet: str) -> str:
+    """
+    원본 코드의 해시를 구합니다.
+    요청마다 한 번만 계산하여 모든 단계(리팩토링/문서화/설명)의 캐시 키로 함께 사용합니다.
+    (문서화/설명 단계도 입력인 리팩토링 결과 대신 원본 코드의 해시로 저장됩니다)
+    """
+    return hashlib.blake2b(code_snippet.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def prompt_fingerprint(*parts: str) -> str:
+    """모델 이름과 프롬프트 문자열로 짧은 지문을 만듭니다."""
+    return hashlib.blake2b('\0'.join(parts).encode('utf-8'), digest_size=8).hexdigest()
+
 
 # --- 2. HTML 템플릿 (변경 없음) ---
 HTML_TEMPLATE = """
@@ -174,75 +284,224 @@ HTML_TEMPLATE = """
 </html>
 """
 
+# ⭐️ 템플릿은 모듈 로드 시 한 번만 컴파일합니다. (render_template_string과 동일하게 autoescape 사용)
+_TEMPLATE = Environment(loader=BaseLoader(), autoescape=True).from_string(HTML_TEMPLATE)
+
 # --- 3. Ollama 헬퍼 함수 (변경 없음) ---
 
+response_cache = ResponseCache(CACHE_PATH, namespace='web-' + prompt_fingerprint(
+    REFACTOR_MODEL, EXPLAIN_MODEL, json.dumps(ANALYZE_OPTIONS, sort_keys=True),
+    ANALYZE_PROMPT, KOREAN_EXPLAIN_PROMPT,
+    REFACTOR_PROMPT, DOCUMENT_PROMPT
+))
+
 def clean_llm_response(response_text: str) -> str:
     """LLM 응답에서 Markdown 코드 블록을 제거합니다."""
-    cleaned_text = re.sub(r'^```[a-zA-Z]*\n', '', response_text.strip())
-    cleaned_text = re.sub(r'\n```$', '', cleaned_text)
-    return cleaned_text.strip()
+    return _FENCE_CLOSE.sub('', _FENCE_OPEN.sub('', response_text.strip())).strip()
 
-def refactor_code(code_snippet: str, language: str) -> (str, str):
+def build_user_message(code_snippet: str, language: str) -> str:
+    """언어 정보를 사용자 메시지 첫 줄에 붙입니다."""
+    return f"Language: {LANGUAGE_NAMES.get(language, language)}\n\n{code_snippet}"
+
+async def warm_up():
+    """통합 프롬프트로 토큰 1개만 생성하여 모델을 미리 올리고, 시스템 프롬프트의 KV 캐시를 채워 둡니다."""
+    client = AsyncClient()
+    await client.chat(
+        model=REFACTOR_MODEL,
+        messages=[{'role': 'system', 'content': ANALYZE_PROMPT}],
+        options={**OPTIONS, 'num_predict': 1},
+        keep_alive=KEEP_ALIVE
+    )
+
+def run_warm_up():
+    """백그라운드 스레드에서 모델을 예열합니다. 실패해도 서비스에는 영향이 없습니다."""
+    try:
+        asyncio.run(warm_up())
+        print("🔥 모델 예열 완료.")
+    except Exception as e:
+        print(f"⚠️ 모델 예열 실패 (무시합니다): {e}")
+
+async def refactor_code(client: AsyncClient, code_snippet: str, language: str, code_hash: str) -> (str, str):
     """선택된 언어의 프롬프트로 코드를 리팩토링합니다."""
     print(f"🤖 AI에게 [{language}] 코드 리팩토링을 요청 중...")
-    system_prompt = REFACTOR_PROMPTS.get(language)
-    if not system_prompt:
+    system_prompt = REFACTOR_PROMPT
+    if language not in LANGUAGE_NAMES:
         return None, f"'{language}' 언어는 지원되지 않습니다."
+    cache_key = response_cache.make_key('refactor', language, code_hash)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        print("⚡ 캐시된 결과를 사용합니다.")
+        return cached, None
     try:
-        response = ollama.chat(
-            model=MODEL_NAME,
+        response = await client.chat(
+            model=REFACTOR_MODEL,
             messages=[
                 {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': code_snippet}
-            ]
+                {'role': 'user', 'content': build_user_message(code_snippet, language)}
+            ],
+            options=OPTIONS,
+            keep_alive=KEEP_ALIVE
         )
         cleaned_code = clean_llm_response(response['message']['content'])
+        response_cache.set(cache_key, cleaned_code)
         return cleaned_code, None
     except Exception as e:
         error_msg = f"Ollama API 호출 중 오류 (리팩토링): {e}"
         print(f"❌ {error_msg}")
         return None, error_msg
 
-def document_code(code_snippet: str, language: str) -> (str, str):
+async def document_code(client: AsyncClient, code_snippet: str, language: str, code_hash: str) -> (str, str):
     """선택된 언어의 프롬프트로 코드에 문서를 추가합니다."""
     print(f"🤖 AI에게 [{language}] 코드 문서화를 요청 중...")
-    system_prompt = DOCUMENT_PROMPTS.get(language)
-    if not system_prompt:
+    system_prompt = DOCUMENT_PROMPT
+    if language not in LANGUAGE_NAMES:
         return None, f"'{language}' 언어는 지원되지 않습니다."
+    cache_key = response_cache.make_key('document', language, code_hash)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        print("⚡ 캐시된 결과를 사용합니다.")
+        return cached, None
     try:
-        response = ollama.chat(
-            model=MODEL_NAME,
+        response = await client.chat(
+            model=REFACTOR_MODEL,
             messages=[
                 {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': code_snippet}
-            ]
+                {'role': 'user', 'content': build_user_message(code_snippet, language)}
+            ],
+            options=OPTIONS,
+            keep_alive=KEEP_ALIVE
         )
         cleaned_code = clean_llm_response(response['message']['content'])
+        response_cache.set(cache_key, cleaned_code)
         return cleaned_code, None
     except Exception as e:
         error_msg = f"Ollama API 호출 중 오류 (문서화): {e}"
         print(f"❌ {error_msg}")
         return None, error_msg
 
-def explain_code_in_korean(code_snippet: str, language: str) -> (str, str):
+async def explain_code_in_korean(client: AsyncClient, code_snippet: str, language: str, code_hash: str) -> (str, str):
     """선택된 언어의 코드를 한국어로 설명합니다."""
     print(f"🤖 AI에게 [{language}] 코드 한국어 설명을 요청 중...")
-    system_prompt = KOREAN_EXPLAIN_PROMPT_TEMPLATE.format(language=language.capitalize())
+    # ⭐️ 시스템 프롬프트는 항상 동일한 문자열로 보내고, 언어 정보는 사용자 메시지에 담습니다.
+    system_prompt = KOREAN_EXPLAIN_PROMPT
+    cache_key = response_cache.make_key('explain', language, code_hash)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        print("⚡ 캐시된 결과를 사용합니다.")
+        return cached, None
     try:
-        response = ollama.chat(
-            model=MODEL_NAME,
+        response = await client.chat(
+            model=EXPLAIN_MODEL,
             messages=[
                 {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': code_snippet}
-            ]
+                {'role': 'user', 'content': build_user_message(code_snippet, language)}
+            ],
+            options=OPTIONS,
+            keep_alive=KEEP_ALIVE
         )
         korean_text = response['message']['content'].strip()
+        response_cache.set(cache_key, korean_text)
         return korean_text, None
     except Exception as e:
         error_msg = f"Ollama API 호출 중 오류 (한국어 설명): {e}"
         print(f"❌ {error_msg}")
         return None, error_msg
 
+async def refactor_and_explain(client: AsyncClient, code_snippet: str, language: str, code_hash: str) -> (dict, str):
+    """리팩토링과 한국어 설명을 한 번의 호출(JSON 모드)로 요청합니다. JSON 해석에 실패하면 (None, None)을 반환합니다."""
+    print(f"🤖 AI에게 [{language}] 코드 리팩토링 + 한국어 설명을 요청 중...")
+    if language not in LANGUAGE_NAMES:
+        return None, f"'{language}' 언어는 지원되지 않습니다."
+    # ⭐️ 시스템 프롬프트는 항상 동일한 문자열로 보내고, 언어 정보는 사용자 메시지에 담습니다.
+    system_prompt = ANALYZE_PROMPT
+    cache_key = response_cache.make_key('analyze', language, code_hash)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        print("⚡ 캐시된 결과를 사용합니다.")
+        return json.loads(cached), None
+    try:
+        response = await client.chat(
+            model=REFACTOR_MODEL,
+            format='json',
+            messages=[
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': build_user_message(code_snippet, language)}
+            ],
+            options=ANALYZE_OPTIONS,
+            keep_alive=KEEP_ALIVE
+        )
+    except Exception as e:
+        error_msg = f"Ollama API 호출 중 오류 (리팩토링 + 한국어 설명): {e}"
+        print(f"❌ {error_msg}")
+        return None, error_msg
+
+    try:
+        data = json.loads(response['message']['content'])
+        ref_code = data['refactored_code']
+        kor_text = data['korean_explanation']
+    except (ValueError, KeyError, TypeError):
+        print("⚠️ JSON 응답을 해석할 수 없어 2단계 방식으로 다시 요청합니다.")
+        return None, None
+    if not isinstance(ref_code, str) or not isinstance(kor_text, str) or not ref_code.strip():
+        print("⚠️ JSON 응답 형식이 올바르지 않아 2단계 방식으로 다시 요청합니다.")
+        return None, None
+    # ⭐️ JSON 문자열 안에 코드 블록이 섞여 오는 경우를 대비해 한 번 더 정리합니다.
+    combined = {
+        'refactored_code': clean_llm_response(ref_code),
+        'korean_explanation': kor_text.strip()
+    }
+    response_cache.set(cache_key, json.dumps(combined, ensure_ascii=False))
+    return combined, None
+
+
+async def run_pipeline(code_snippet: str, language: str) -> dict:
+    """리팩토링 + 한국어 설명을 한 번에 요청한 뒤 문서화를 진행합니다."""
+    result = {'refactored_code': '', 'final_code': '', 'korean_explanation': '', 'errors': []}
+    # ⭐️ AsyncClient는 이벤트 루프에 묶이므로 요청마다 새로 만듭니다.
+    client = AsyncClient()
+    # ⭐️ 원본 코드의 해시는 한 번만 계산하여 모든 단계의 캐시 키로 사용합니다.
+    code_hash = hash_code(code_snippet)
+
+    # 1단계 + 3단계: 리팩토링과 한국어 설명을 한 번의 호출로 처리
+    combined, err_combined = await refactor_and_explain(client, code_snippet, language, code_hash)
+    if err_combined:
+        result['errors'].append(err_combined)
+        return result
+
+    if combined:
+        result['refactored_code'] = combined['refactored_code']
+        result['korean_explanation'] = combined['korean_explanation']
+
+        # 2단계: 문서화 (영어 Docstrings)
+        doc_code, err_doc = await document_code(client, combined['refactored_code'], language, code_hash)
+        if err_doc:
+            result['errors'].append(err_doc)
+        else:
+            result['final_code'] = doc_code
+        return result
+
+    # (대체 경로) 1단계: 리팩토링
+    ref_code, err_ref = await refactor_code(client, code_snippet, language, code_hash)
+    if err_ref:
+        result['errors'].append(err_ref)
+        return result
+    result['refactored_code'] = ref_code
+
+    # 2단계 + 3단계: 문서화 (영어 Docstrings) 와 한국어 설명은 서로 독립적이므로 병렬 실행
+    (doc_code, err_doc), (kor_text, err_kor) = await asyncio.gather(
+        document_code(client, ref_code, language, code_hash),
+        explain_code_in_korean(client, ref_code, language, code_hash)
+    )
+    if err_doc:
+        result['errors'].append(err_doc)
+    else:
+        result['final_code'] = doc_code
+    if err_kor:
+        result['errors'].append(err_kor)
+    else:
+        result['korean_explanation'] = kor_text
+    return result
+
 
 # --- 4. Flask 라우트 (변경 없음) ---
 @app.route('/', methods=['GET', 'POST'])
@@ -258,31 +517,14 @@ def home():
         original_code = request.form.get('code_input', '')
         selected_language = request.form.get('language', 'python')
         
-        # 1단계: 리팩토링
-        ref_code, err_ref = refactor_code(original_code, selected_language)
-        if err_ref:
-            error = err_ref
-        else:
-            refactored_code = ref_code
-            
-            # 2단계: 문서화 (영어 Docstrings)
-            doc_code, err_doc = document_code(refactored_code, selected_language)
-            if err_doc:
-                if error: error += f"\n{err_doc}"
-                else: error = err_doc
-            else:
-                final_code = doc_code 
-
-            # 3단계: 한국어 설명 (리팩토링된 코드를 기반으로 생성)
-            kor_text, err_kor = explain_code_in_korean(refactored_code, selected_language)
-            if err_kor:
-                if error: error += f"\n{err_kor}"
-                else: error = err_kor
-            else:
-                korean_explanation = kor_text
-
-    return render_template_string(
-        HTML_TEMPLATE,
+        result = asyncio.run(run_pipeline(original_code, selected_language))
+        refactored_code = result['refactored_code']
+        final_code = result['final_code']
+        korean_explanation = result['korean_explanation']
+        if result['errors']:
+            error = "\n".join(result['errors'])
+
+    return _TEMPLATE.render(
         original_code=original_code,
         refactored_code=refactored_code,
         final_code=final_code, 
@@ -291,6 +533,20 @@ def home():
         selected_language=selected_language
     )
 
-# --- 5. Flask 앱 실행 (변경 없음) ---
+# --- 5. Flask 앱 실행 ---
+# ⭐️ 기본은 waitress(멀티스레드 WSGI 서버)로 실행하여, 한 사용자의 긴 Ollama 호출이
+#    다른 탭/사용자의 요청을 막지 않도록 합니다. (생성 순서는 Ollama 서버가 큐로 관리)
+#    개발 중에는 FLASK_DEBUG=1 로 실행하면 기존처럼 Flask 개발 서버(자동 재시작)를 사용합니다.
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 5000
+SERVER_THREADS = 8
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # ⭐️ 첫 요청이 모델 로딩을 기다리지 않도록 백그라운드에서 미리 예열합니다.
+    threading.Thread(target=run_warm_up, daemon=True).start()
+    if os.environ.get('FLASK_DEBUG') == '1':
+        app.run(debug=True, host=SERVER_HOST, port=SERVER_PORT)
+    else:
+        from waitress import serve
+        print(f"🚀 http://{SERVER_HOST}:{SERVER_PORT} 에서 서버를 시작합니다. (스레드 {SERVER_THREADS}개)")
+        serve(app, host=SERVER_HOST, port=SERVER_PORT, threads=SERVER_THREADS)
@@ -1,11 +1,19 @@
 import sys
 import subprocess
+import shutil
+import socket
 import time
+import importlib
+import importlib.util
 
 # --- 0. 설치할 항목 정의 ---
-MODEL_TO_DOWNLOAD = 'llama3:8b'
-LIBRARIES_TO_INSTALL = ['ollama', 'PyQt6']
+# 리팩토링용 모델 + 한국어 설명용 소형 모델 (AICodeRefactorer.py의 REFACTOR_MODEL, EXPLAIN_MODEL과 같아야 합니다)
+MODELS_TO_DOWNLOAD = ['llama3:8b', 'llama3.2:3b-instruct-q4_K_M']
+# pip 패키지 이름 -> import 할 모듈 이름
+LIBRARIES_TO_INSTALL = {'ollama': 'ollama', 'PyQt6': 'PyQt6'}
 CHECK_FILE_NAME = 'AICodeRefactorer.exe' # 메인 프로그램 이름
+OLLAMA_SERVER = ('127.0.0.1', 11434) # Ollama 서버 주소
+PROGRESS_PRINT_INTERVAL = 0.2 # 다운로드 진행률 출력 간격 (초). 출력이 너무 잦으면 Windows 콘솔이 느려집니다.
 
 print("--- AI 모델 및 라이브러리 자동 설치 ---")
 print(f"'{CHECK_FILE_NAME}'에 필요한 항목들을 설치합니다.")
@@ -17,16 +25,36 @@ print("-" * 60)
 print(f"\n1. 필수 Python 라이브러리 설치를 시작합니다...")
 print(f"   설치 대상: {', '.join(LIBRARIES_TO_INSTALL)}")
 
+# ⭐️ 이미 import 가능한 라이브러리는 건너뜁니다. (pip를 실행하지 않으므로 재실행이 훨씬 빠릅니다)
+missing = [package for package, module in LIBRARIES_TO_INSTALL.items()
+           if importlib.util.find_spec(module) is None]
+
 # sys.executable은 현재 실행 중인 파이썬의 경로를 사용합니다.
 # 이렇게 하면 가상환경 등에서도 정확한 pip를 찾아 실행합니다.
 try:
-    command = [sys.executable, "-m", "pip", "install"] + LIBRARIES_TO_INSTALL
-    
-    # check=True: 설치 실패 시 예외를 발생시킵니다.
-    # encoding='utf-8': 한글 출력이 깨지지 않도록 합니다.
-    subprocess.run(command, check=True, encoding='utf-8')
-    
-    print("\n   [성공] 모든 라이브러리가 성공적으로 설치/확인되었습니다.")
+    if not missing:
+        print("\n   [성공] 모든 라이브러리가 이미 설치되어 있습니다.")
+    else:
+        print(f"   설치가 필요한 항목: {', '.join(missing)}")
+        uv_path = shutil.which('uv')
+        if uv_path:
+            # ⭐️ uv(Rust로 작성된 pip 대체 도구)가 있으면 사용합니다. 의존성 해석과 설치가 훨씬 빠릅니다.
+            # --python: 가상환경이 아니어도 현재 실행 중인 파이썬에 설치하도록 지정합니다.
+            print("   (uv를 사용하여 설치합니다)")
+            command = [uv_path, "pip", "install", "--python", sys.executable] + missing
+        else:
+            # --disable-pip-version-check: pip 자체 업데이트 확인(네트워크 요청)을 건너뜁니다.
+            # --no-input: 입력을 기다리며 멈추지 않도록 합니다.
+            command = [sys.executable, "-m", "pip", "install",
+                       "--disable-pip-version-check", "--no-input"] + missing
+
+        # check=True: 설치 실패 시 예외를 발생시킵니다.
+        # encoding='utf-8': 한글 출력이 깨지지 않도록 합니다.
+        subprocess.run(command, check=True, encoding='utf-8')
+
+        # 방금 설치한 패키지를 이 프로세스에서 바로 import 할 수 있도록 캐시를 갱신합니다.
+        importlib.invalidate_caches()
+        print("\n   [성공] 모든 라이브러리가 성공적으로 설치/확인되었습니다.")
 
 except subprocess.CalledProcessError as e:
     print("\n   [치명적 오류] Python 라이브러리 설치에 실패했습니다!")
@@ -54,11 +82,13 @@ except ImportError:
 
 # --- 2. Ollama 서버 확인 ---
 print("\n2. Ollama 서버에 연결을 시도 중입니다...")
+# ⭐️ TCP 연결만 시도하여 서버가 떠 있는지 확인합니다. (ollama.list()처럼 모델 목록 전체를 받아오지 않습니다)
 try:
-    ollama.list()
+    with socket.create_connection(OLLAMA_SERVER, timeout=0.5):
+        pass
     print("   [성공] Ollama 서버가 응답했습니다.")
     
-except Exception as e:
+except OSError:
     print("\n   [치명적 오류] Ollama 서버에 연결할 수 없습니다!")
     print("   Ollama 프로그램이 설치되어 있고 실행 중인지 확인하세요.")
     print("   프로그램을 종료합니다.")
@@ -67,29 +97,35 @@ except Exception as e:
     sys.exit(1)
 
 # --- 3. 모델 다운로드 ---
-print(f"\n3. '{MODEL_TO_DOWNLOAD}' 모델 다운로드를 시작합니다...")
+print(f"\n3. 모델 다운로드를 시작합니다... (대상: {', '.join(MODELS_TO_DOWNLOAD)})")
 try:
-    stream = ollama.pull(MODEL_TO_DOWNLOAD, stream=True)
-    last_status = ""
-    last_percent = -1
-
-    for chunk in stream:
-        if 'status' in chunk:
-            status = chunk['status']
-            if status != last_status:
-                print(f"\n   [상태] {status}")
+    inv_gb = 1.0 / (1024**3)
+
+    for model_name in MODELS_TO_DOWNLOAD:
+        print(f"\n   ▶ '{model_name}' 모델 다운로드")
+        stream = ollama.pull(model_name, stream=True)
+        last_status = ""
+        last_percent = -1
+        last_print_ts = 0.0
+
+        for chunk in stream:
+            status = chunk.get('status')
+            if status and status != last_status:
+                sys.stdout.write(f"\n   [상태] {status}\n")
+                sys.stdout.flush()
                 last_status = status
 
-        if 'total' in chunk and 'completed' in chunk:
-            total = chunk['total']
-            completed = chunk['completed']
-            percent = round((completed / total) * 100)
-            
-            if percent != last_percent:
-                gb_completed = completed / (1024**3)
-                gb_total = total / (1024**3)
-                print(f"   [진행] {gb_completed:.2f} GB / {gb_total:.2f} GB ({percent}%)", end='\r')
-                last_percent = percent
+            total = chunk.get('total')
+            completed = chunk.get('completed')
+            if total and completed is not None:
+                percent = round((completed / total) * 100)
+                now = time.monotonic()
+
+                if percent != last_percent and (now - last_print_ts > PROGRESS_PRINT_INTERVAL or percent == 100):
+                    sys.stdout.write(f"   [진행] {completed * inv_gb:.2f} GB / {total * inv_gb:.2f} GB ({percent}%)\r")
+                    sys.stdout.flush()
+                    last_percent = percent
+                    last_print_ts = now
 
     print("\n\n" + "-" * 60)
     print("🎉 [설치 완료] 모든 라이브러리와 AI 모델이 성공적으로 설치되었습니다.")